@@ -1,15 +1,27 @@
 import json
 import os
+import functools
 import zipfile
+import mmap
+import codecs
 import hashlib
 import logging
-from datetime import datetime
 import time
-from typing import Dict, Set, Optional, Tuple
+from typing import Callable, Dict, Iterable, Set, Optional, Tuple
 from urllib.parse import urlparse
-from fuzzywuzzy import fuzz
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from rapidfuzz import fuzz, process, utils
 import base64
 import gzip
+import io
+import ahocorasick
+import numpy as np
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # inotify is Linux-only; fall back to polling the download dir
+    INotify = None
 
 from botasaurus.browser import Driver, cdp
 from botasaurus_driver.core import util
@@ -20,11 +32,14 @@ class AutomationError(Exception):
     """Custom exception for wallet automation errors"""
     pass
 
+_LOG_CONFIGURED = False
+
 def setup_logging():
-    """Configure logging with custom format and both file and console handlers."""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    log_file = f'tmp/automation_{timestamp}.log'
-    
+    """Configure logging with custom format and a console handler. Safe to call repeatedly."""
+    global _LOG_CONFIGURED
+    if _LOG_CONFIGURED:
+        return logging.getLogger(__name__)
+
     log_format = '%(asctime)s [%(levelname)s] %(message)s'
     date_format = '%Y-%m-%d %H:%M:%S'
     
@@ -36,6 +51,7 @@ def setup_logging():
             logging.StreamHandler()
         ]
     )
+    _LOG_CONFIGURED = True
     
     return logging.getLogger(__name__)
 
@@ -48,86 +64,157 @@ def find_project_root():
     # Fallback path (adjust if necessary)
     return os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
 
+# Chrome extension IDs spell hex digits 0-f as letters a-p
+_HEX_TO_ALPHA = bytes.maketrans(b"0123456789abcdef", b"abcdefghijklmnop")
+
 def generate_extension_id(extension_path: str) -> str:
     """Generates the extension ID for an unpacked Chrome extension."""
     logger.info("Generating extension ID...")
     try:
         normalized_path = os.path.normpath(extension_path)
-        m = hashlib.sha256()
-        m.update(normalized_path.encode('utf-8'))
-        ext_id = ''.join([chr(int(i, base=16) + ord('a')) for i in m.hexdigest()][:32])
+        # Only the first 16 bytes (32 hex digits) of the digest form the ID
+        digest = hashlib.sha256(normalized_path.encode('utf-8')).digest()[:16]
+        ext_id = digest.hex().encode('ascii').translate(_HEX_TO_ALPHA).decode('ascii')
         logger.info(f"Extension ID generated successfully: {ext_id}")
         return ext_id
     except Exception as e:
         logger.error(f"Failed to generate extension ID: {str(e)}")
         raise AutomationError(f"Failed to generate extension ID: {str(e)}")
 
+def unpack_extension(extension_crx: str, extension_dir: str):
+    """
+    Unpacks the extension CRX into extension_dir, skipping extraction when the
+    directory already holds this CRX (warm Lambda containers keep /tmp).
+    """
+    sha = hashlib.sha256()
+    with open(extension_crx, 'rb') as f:
+        while chunk := f.read(64 * 1024):
+            sha.update(chunk)
+    crx_hash = sha.hexdigest()
+
+    sentinel = os.path.join(extension_dir, '.crx_hash')
+    try:
+        with open(sentinel, 'r') as f:
+            if f.read().strip() == crx_hash:
+                logger.info("Reusing unpacked extension")
+                return
+    except OSError:
+        pass
+
+    logger.info("Unpacking extension...")
+    try:
+        with zipfile.ZipFile(extension_crx, 'r') as zip_ref:
+            zip_ref.extractall(extension_dir)
+        with open(sentinel, 'w') as f:
+            f.write(crx_hash)
+        logger.info("Extension unpacked successfully")
+    except zipfile.BadZipFile:
+        logger.error("Invalid or corrupted extension file")
+        raise AutomationError("Invalid or corrupted extension file")
+
 class FileMatcher:
-    def __init__(self):
+    def __init__(self, urls: Iterable[str]):
         self.minimum_score = 60  # Minimum fuzzy match score (0-100)
+        self.urls = frozenset(urls)  # Content matching is compiled for exactly these URLs
+        self._content_cache: Dict[Tuple[str, int], Dict[str, float]] = {}  # (filepath, mtime_ns) -> {url: score}
+        self._match_content = _compile_matcher(self.urls)  # latin-1 content -> {url: score}
 
-    def get_best_match(self, query: str, candidates: list[str], download_dir: str) -> Tuple[Optional[str], int]:
+    def precompute_url(self, url: str) -> Dict:
         """
-        Find the best matching filename using both fuzzy matching and content checking.
-        Returns tuple of (best_match, score)
+        Extract everything the filename matcher needs from a URL so it is
+        computed once per tracker rather than on every poll.
         """
-        best_match = None
-        best_score = 0
-
-        # Extract domain and searchable parts from query
-        query_parts = self._extract_searchable_parts(query)
-        domain = self._extract_domain(query)
-        
-        for candidate in candidates:
-            # First check content match
-            filepath = os.path.join(download_dir, candidate)
-            content_match_score = self._check_content_match(filepath, domain, query)
-            
-            # Then check filename match
-            filename_scores = [fuzz.partial_ratio(part.lower(), candidate.lower()) 
-                             for part in query_parts]
-            filename_score = max(filename_scores) if filename_scores else 0
-            
-            # Combine scores - weight content match more heavily
-            final_score = (content_match_score * 0.7) + (filename_score * 0.3)
-            
-            if final_score > best_score and final_score >= self.minimum_score:
-                best_score = final_score
-                best_match = candidate
-
-        return best_match, int(best_score)
+        if url not in self.urls:
+            raise ValueError(f"URL {url} was not passed to FileMatcher, so its content cannot be matched")
+        parts = self._extract_searchable_parts(url)
+        return {
+            'url': url,
+            'parts_lower': [part.lower() for part in parts],
+            'parts_norm': [utils.default_process(part) for part in parts],
+        }
 
-    def _check_content_match(self, filepath: str, domain: str, url: str) -> float:
+    def get_best_matches(self, url_features: list[Dict], candidates: list[str], download_dir: str) -> list[Tuple[Optional[str], int]]:
         """
-        Check if the URL or domain appears in the file content.
-        Returns a score from 0-100.
+        Find the best matching filename for each URL using both fuzzy matching and content checking.
+        `url_features` are results of `precompute_url`; all URLs are scored against all candidates at once.
+        Returns a (best_match, score) tuple per URL, in the order given.
+        """
+        if not url_features or not candidates:
+            return [(None, 0)] * len(url_features)
+
+        # Exact substring hits get a full filename score without fuzzy matching
+        candidates_lower = [candidate.lower() for candidate in candidates]
+        filename_scores = np.array([[100 if any(part in candidate_lower for part in features['parts_lower']) else 0
+                                     for candidate_lower in candidates_lower]
+                                    for features in url_features], dtype=np.uint8)
+
+        # Flatten every URL's query parts so one cdist call scores them all;
+        # row_starts marks where each URL's parts begin for the per-URL reduction
+        fuzzy_rows = [i for i, features in enumerate(url_features) if features['parts_norm']]
+        fuzzy_cols = np.flatnonzero(filename_scores[fuzzy_rows].min(axis=0) < 100) if fuzzy_rows else []
+        if len(fuzzy_cols):
+            all_parts = [part for i in fuzzy_rows for part in url_features[i]['parts_norm']]
+            row_starts = np.cumsum([0] + [len(url_features[i]['parts_norm']) for i in fuzzy_rows[:-1]])
+            candidates_norm = [utils.default_process(candidates[j]) for j in fuzzy_cols]
+            scores = process.cdist(all_parts, candidates_norm, scorer=fuzz.partial_ratio,
+                                   processor=None, workers=-1, dtype=np.uint8)
+            per_url = np.maximum.reduceat(scores, row_starts, axis=0)
+            block = filename_scores[np.ix_(fuzzy_rows, fuzzy_cols)]
+            filename_scores[np.ix_(fuzzy_rows, fuzzy_cols)] = np.maximum(block, per_url)
+
+        # Content scores come from one cached automaton scan per file
+        content_scores = np.zeros(filename_scores.shape)
+        for j, candidate in enumerate(candidates):
+            file_scores = self._check_content_match(os.path.join(download_dir, candidate))
+            if file_scores:
+                for i, features in enumerate(url_features):
+                    content_scores[i, j] = file_scores.get(features['url'], 0)
+
+        # Combine scores - weight content match more heavily
+        final_scores = (content_scores * 0.7) + (filename_scores * 0.3)
+        best_indices = final_scores.argmax(axis=1)
+
+        matches = []
+        for i, j in enumerate(best_indices):
+            best_score = final_scores[i, j]
+            if best_score > 0 and best_score >= self.minimum_score:
+                matches.append((candidates[j], int(best_score)))
+            else:
+                matches.append((None, 0))
+        return matches
+
+    def _check_content_match(self, filepath: str) -> Dict[str, float]:
+        """
+        Check which tracked URLs or domains appear in the file content.
+        Returns a {url: score} dict with scores from 0-100; URLs without a hit are absent.
+        Scores are cached until the file is modified.
         """
         try:
-            # Read first 1MB of file to check for URL/domain
-            with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read(1024 * 1024)
-                
-            # Check for exact URL match
-            if url in content:
-                return 100
-                
-            # Check for domain match
-            if domain and domain in content:
-                return 80
-                
-            # Check for partial URL match
-            url_parts = url.split('/')
-            matches = sum(1 for part in url_parts if part and part in content)
-            if matches:
-                return min(60 + (matches * 10), 90)
-                
-            return 0
-            
+            cache_key = (filepath, os.stat(filepath).st_mtime_ns)
+            if cache_key not in self._content_cache:
+                self._content_cache[cache_key] = self._scan_content(filepath)
+            return self._content_cache[cache_key]
+
         except Exception as e:
             logging.warning(f"Error checking file content for {filepath}: {str(e)}")
-            return 0
-
-    def _extract_domain(self, url: str) -> Optional[str]:
+            return {}
+
+    def _scan_content(self, filepath: str) -> Dict[str, float]:
+        """Scan the start of a file once and score it against every tracked URL."""
+        # Map the first 1MB of the file and decode straight from the mapping;
+        # latin-1 maps each byte to one code point without UTF-8 validation
+        with open(filepath, 'rb') as f:
+            size = min(1 << 20, os.fstat(f.fileno()).st_size)
+            if not size:
+                return {}
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                content, _ = codecs.latin_1_decode(mm)
+
+        return self._match_content(content)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _extract_domain(url: str) -> Optional[str]:
         """Extract domain from URL."""
         try:
             parsed = urlparse(url)
@@ -135,7 +222,9 @@ class FileMatcher:
         except Exception:
             return None
 
-    def _extract_searchable_parts(self, url: str) -> list[str]:
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _extract_searchable_parts(url: str) -> Tuple[str, ...]:
         """Extract various parts from URL that might match filename."""
         try:
             parsed = urlparse(url)
@@ -153,9 +242,55 @@ class FileMatcher:
             path_parts = [p for p in parsed.path.split('/') if p]
             parts.extend(path_parts)
             
-            return list(filter(None, parts))
+            return tuple(filter(None, parts))
         except Exception:
-            return [url]
+            return (url,)
+
+def _compile_matcher(urls: Iterable[str]) -> Callable[[str], Dict[str, float]]:
+    """
+    Build a content scorer specialized to a fixed set of URLs. One Aho-Corasick
+    automaton over every full URL, domain and URL part is captured in a closure
+    together with the score each pattern implies, so scoring a file is a single
+    pass over its content with only local lookups.
+    """
+    automaton = ahocorasick.Automaton()
+    for url in urls:
+        patterns = [(url, 100)]  # Exact URL match
+        domain = FileMatcher._extract_domain(url)
+        if domain:
+            patterns.append((domain, 80))  # Domain match
+        patterns = [(pattern, score, 1) for pattern, score in patterns]
+        # Partial URL match, scored by count; a repeated path segment counts once per occurrence
+        part_counts = Counter(part for part in url.split('/') if part)
+        patterns.extend((part, 0, count) for part, count in part_counts.items())
+
+        for pattern, score, count in patterns:
+            # Keys are the pattern's UTF-8 bytes viewed as latin-1 so they match raw file bytes
+            key = pattern.encode('utf-8').decode('latin-1')
+            entries = automaton.get(key, ())
+            automaton.add_word(key, entries + ((url, score, pattern, count),))
+
+    if len(automaton) == 0:
+        return lambda content: {}
+    automaton.make_automaton()
+    iter_hits = automaton.iter
+
+    def match(content: str) -> Dict[str, float]:
+        exact: Dict[str, float] = {}
+        partial: Dict[str, Dict[str, int]] = {}
+        for _, entries in iter_hits(content):
+            for url, score, pattern, count in entries:
+                if score:
+                    if score > exact.get(url, 0):
+                        exact[url] = score
+                else:
+                    partial.setdefault(url, {})[pattern] = count
+
+        scores = {url: min(60 + (sum(found.values()) * 10), 90) for url, found in partial.items()}
+        scores.update(exact)
+        return scores
+
+    return match
 
 class DownloadTracker:
     def __init__(self, download_dir: str, urls: list):
@@ -163,33 +298,80 @@ class DownloadTracker:
         self.urls = set(urls)
         self.downloaded_files: Set[str] = set()
         self.url_to_file_mapping: Dict[str, str] = {}
-        self.initial_files = set(os.listdir(download_dir))
-        self.file_matcher = FileMatcher()
-        
-    def check_new_downloads(self) -> bool:
-        """Check for new downloads and map them to URLs using fuzzy matching."""
-        current_files = set(os.listdir(self.download_dir))
-        new_files = current_files - self.initial_files - self.downloaded_files
+        self.initial_files = frozenset(os.listdir(download_dir))
+        self.file_matcher = FileMatcher(self.urls)
+        self._url_features = {url: self.file_matcher.precompute_url(url) for url in self.urls}
+        self.completed_files: Set[str] = set()
+        self._inotify = self._start_watch()
+
+    def _start_watch(self):
+        """Watch the download dir for finished files, or return None if inotify is unavailable."""
+        if INotify is None:
+            return None
+        try:
+            inotify = INotify()
+            inotify.add_watch(self.download_dir, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+            return inotify
+        except OSError as e:
+            logger.warning(f"inotify unavailable, polling download dir instead: {str(e)}")
+            return None
 
-        # Dynamically wait for .crdownload files to finish
-        while any(file.endswith('.crdownload') for file in new_files):
-            print("Waiting for .crdownload files to complete...")
-            # Check for changes every second, adjust as needed
-            current_files_temp = set(os.listdir(self.download_dir))
-            if current_files_temp == current_files:
-                # If no change in files, break to avoid infinite loop
+    def close(self):
+        """Release the inotify watch, if any."""
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _drain_events(self) -> Set[str]:
+        """Collect files that finished writing or were renamed into place since the last check."""
+        for event in self._inotify.read(timeout=0):
+            if event.mask & inotify_flags.Q_OVERFLOW:
+                # Events were dropped; recover any finished downloads from the directory itself
+                logger.warning("inotify event queue overflowed, rescanning download dir")
+                self.completed_files.update(name for name in self._scan_new_files()
+                                            if not name.endswith('.crdownload'))
+            elif event.mask & inotify_flags.ISDIR:
+                continue
+            elif event.name and not event.name.endswith('.crdownload'):
+                self.completed_files.add(event.name)
+        return self.completed_files - self.initial_files - self.downloaded_files
+
+    def _list_new_files(self) -> Set[str]:
+        """Diff the download dir against known files, waiting for .crdownload files to finish."""
+        new_files = self._scan_new_files()
+
+        # Wait for .crdownload files to finish, sleeping between checks (up to 30s)
+        for _ in range(60):
+            if not any(file.endswith('.crdownload') for file in new_files):
                 break
-            current_files = current_files_temp
-            new_files = current_files - self.initial_files - self.downloaded_files
+            print("Waiting for .crdownload files to complete...")
+            time.sleep(0.5)
+            new_files = self._scan_new_files()
+
+        return new_files
+
+    def _scan_new_files(self) -> Set[str]:
+        """Single pass over the download dir collecting regular files not seen before."""
+        with os.scandir(self.download_dir) as entries:
+            return {entry.name for entry in entries
+                    if entry.name not in self.initial_files
+                    and entry.name not in self.downloaded_files
+                    and entry.is_file()}
+
+    def check_new_downloads(self) -> bool:
+        """Check for new downloads and map them to URLs using fuzzy matching."""
+        if self._inotify is not None:
+            new_files = self._drain_events()
+        else:
+            new_files = self._list_new_files()
         
         if new_files:
-            # Check each unmatched URL against new files
-            for url in self.urls:
-                if url in self.url_to_file_mapping:
-                    continue
-
-                best_match, score = self.file_matcher.get_best_match(url, list(new_files), self.download_dir)
+            # Match every unmatched URL against the new files in one batch
+            unmatched_urls = [url for url in self.urls if url not in self.url_to_file_mapping]
+            matches = self.file_matcher.get_best_matches([self._url_features[url] for url in unmatched_urls],
+                                                         list(new_files), self.download_dir)
 
+            for url, (best_match, score) in zip(unmatched_urls, matches):
                 if best_match:
                     self.url_to_file_mapping[url] = best_match
                     self.downloaded_files.add(best_match)
@@ -224,32 +406,41 @@ class DownloadTracker:
     def get_url_mapping_with_content(self) -> Dict[str, Dict]:
         """
         Returns a dictionary mapping URLs to file details including compressed and encoded content.
+        Files are encoded concurrently; gzip, base64 and file I/O release the GIL.
         """
-        url_mapping = {}
-        for url, filename in self.url_to_file_mapping.items():
-            filepath = os.path.join(self.download_dir, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                # Compress the content
-                compressed_content = gzip.compress(content.encode('utf-8'))
+        items = list(self.url_to_file_mapping.items())
+        if not items:
+            return {}
 
-                # Encode the compressed content in base64
-                encoded_content = base64.b64encode(compressed_content).decode('utf-8')
+        with ThreadPoolExecutor(max_workers=min(8, len(items))) as executor:
+            return dict(executor.map(lambda item: self._encode_one(*item), items))
 
-                url_mapping[url] = {
-                    'filename': filename,
-                    'content': encoded_content
-                }
-            except Exception as e:
-                logger.error(f"Error reading or encoding content from {filepath}: {str(e)}")
-                url_mapping[url] = {
-                    'filename': filename,
-                    'content': None,
-                    'error': str(e)
-                }
-        return url_mapping
+    def _encode_one(self, url: str, filename: str) -> Tuple[str, Dict]:
+        """Read, compress and base64 encode a single downloaded file."""
+        filepath = os.path.join(self.download_dir, filename)
+        try:
+            # Stream the raw bytes through gzip in chunks to bound peak memory;
+            # level 1 trades a little size for much less Lambda CPU, mtime=0 keeps output deterministic
+            buffer = io.BytesIO()
+            with open(filepath, 'rb') as f, gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=1, mtime=0) as gz:
+                while chunk := f.read(64 * 1024):
+                    gz.write(chunk)
+
+            # Encode the compressed content in base64 straight from the buffer, without copying it out
+            with buffer.getbuffer() as compressed_content:
+                encoded_content = base64.b64encode(compressed_content).decode('ascii')
+
+            return url, {
+                'filename': filename,
+                'content': encoded_content
+            }
+        except Exception as e:
+            logger.error(f"Error reading or encoding content from {filepath}: {str(e)}")
+            return url, {
+                'filename': filename,
+                'content': None,
+                'error': str(e)
+            }
 
 def main(extension_crx="mpiodijhokgodhhofbcjdecpffjipkle.crx",
                extension_directory="unpacked_extension", 
@@ -275,14 +466,7 @@ def main(extension_crx="mpiodijhokgodhhofbcjdecpffjipkle.crx",
         logger.info(f"Using download directory: {download_dir}")
         
         # Unpack extension
-        logger.info("Unpacking extension...")
-        try:
-            with zipfile.ZipFile(extension_crx, 'r') as zip_ref:
-                zip_ref.extractall(extension_dir)
-            logger.info("Extension unpacked successfully")
-        except zipfile.BadZipFile:
-            logger.error("Invalid or corrupted extension file")
-            raise AutomationError("Invalid or corrupted extension file")
+        unpack_extension(extension_crx, extension_dir)
 
         extension_id = generate_extension_id(extension_dir)
         extension_url = f"chrome-extension://{extension_id}/src/ui/pages/batch-save-urls.html"
@@ -339,6 +523,8 @@ def main(extension_crx="mpiodijhokgodhhofbcjdecpffjipkle.crx",
         logger.error(f"Error during automation: {str(e)}")
         raise
     finally:
+        if tracker:
+            tracker.close()
        
         if driver:
             ## hacky but botosaurus has a bug when closing the browser